@@ -1,16 +1,134 @@
 """DON'T USE THIS MODULE: Under development."""
+from copy import deepcopy
+from functools import partial
+from typing import Callable, List, Union
 
+import torch
+import torch.nn.functional as F
 from torch import nn
 
 from pipegoose.distributed.parallel_context import ParallelContext
 
 
 class Experts(nn.Module):
+    """
+    A group of experts, each one computes the tokens dispatched to it.
+
+    NOTE: if `expert` is a linear layer, the weights of all experts are stored in
+    a single tensor (`is_grouped` is True), so all of them are computed by one batched matmul,
+    unless the tokens are so unevenly dispatched that padding them would cost more than it saves.
+    """
+
+    # NOTE: the largest number of tokens (including padding) that the batched matmul
+    # may compute, as a multiple of the number of dispatched tokens
+    MAX_PADDING_RATIO = 2
+
     def __init__(self, num_experts: int, expert: nn.Module, parallel_context: ParallelContext):
         super().__init__()
         self.num_experts = num_experts
-        self.experts = nn.ModuleList([expert for _ in range(num_experts)])
         self.parallel_context = parallel_context
+        self.is_grouped = isinstance(expert, nn.Linear)
+
+        if self.is_grouped:
+            self.weight = nn.Parameter(expert.weight.detach().repeat(num_experts, 1, 1))
+            if expert.bias is not None:
+                self.bias = nn.Parameter(expert.bias.detach().repeat(num_experts, 1))
+            else:
+                self.register_parameter("bias", None)
+        else:
+            # NOTE: each expert has its own weights
+            self.experts = nn.ModuleList([deepcopy(expert) for _ in range(num_experts)])
+
+    @property
+    def experts(self) -> Union[nn.ModuleList, List[Callable]]:
+        """
+        The experts, indexed by expert.
+
+        NOTE: if the experts are grouped, each expert is a linear layer
+        over a view of its slice of the grouped weight.
+        """
+        if not self.is_grouped:
+            return self._modules["experts"]
+
+        return [
+            partial(F.linear, weight=self.weight[idx], bias=None if self.bias is None else self.bias[idx])
+            for idx in range(self.num_experts)
+        ]
+
+    def forward(self, inputs: torch.Tensor, dispatching_order: torch.Tensor, *args, **kwargs) -> torch.Tensor:
+        """
+        Compute the outputs of the experts for the tokens dispatched to them.
+
+        Args:
+            inputs: the tokens, shape (..., hidden_size)
+            dispatching_order: one-hot expert assignment of each token, shape (..., num_experts)
+        """
+        hidden_size = inputs.shape[-1]
+        flat_inputs = inputs.reshape(-1, hidden_size)
+        expert_idxs = dispatching_order.reshape(-1, self.num_experts).argmax(dim=-1)
+        num_tokens_per_expert = torch.bincount(expert_idxs, minlength=self.num_experts)
+        # NOTE: both paths need the counts on the host, so sync only once
+        num_tokens_per_expert_list = num_tokens_per_expert.tolist()
+
+        if self.is_grouped and self._is_worth_grouping(num_tokens_per_expert_list):
+            outputs = self._grouped_forward(flat_inputs, expert_idxs, num_tokens_per_expert, max(num_tokens_per_expert_list))
+        else:
+            outputs = self._sequential_forward(flat_inputs, expert_idxs, num_tokens_per_expert_list, *args, **kwargs)
+
+        return outputs.view(*inputs.shape[:-1], outputs.shape[-1])
+
+    def _is_worth_grouping(self, num_tokens_per_expert: List[int]) -> bool:
+        # NOTE: every expert is padded to the number of tokens of the busiest one,
+        # so if one expert gets most of the tokens, the batched matmul computes
+        # up to num_experts times more tokens than running the experts one by one
+        num_padded_tokens = max(num_tokens_per_expert) * self.num_experts
+        return num_padded_tokens <= self.MAX_PADDING_RATIO * sum(num_tokens_per_expert)
+
+    def _grouped_forward(
+        self, flat_inputs: torch.Tensor, expert_idxs: torch.Tensor, num_tokens_per_expert: torch.Tensor, max_num_tokens: int
+    ) -> torch.Tensor:
+        # NOTE: find the position of each token among the tokens of its expert
+        sorted_idxs = expert_idxs.argsort()
+        offsets = num_tokens_per_expert.cumsum(dim=0) - num_tokens_per_expert
+        sorted_positions = torch.arange(expert_idxs.shape[0], device=expert_idxs.device) - offsets[expert_idxs[sorted_idxs]]
+        positions = torch.empty_like(expert_idxs)
+        positions[sorted_idxs] = sorted_positions
+
+        # NOTE: scatter the tokens straight into a buffer where the tokens of every expert
+        # are padded to the same length, so all experts are computed in a single batched matmul
+        grouped_inputs = flat_inputs.new_zeros(self.num_experts, max_num_tokens, flat_inputs.shape[-1])
+        grouped_inputs[expert_idxs, positions] = flat_inputs
+
+        weight = self.weight.transpose(1, 2)
+        if self.bias is not None:
+            grouped_outputs = torch.baddbmm(self.bias.unsqueeze(1), grouped_inputs, weight)
+        else:
+            grouped_outputs = torch.bmm(grouped_inputs, weight)
+
+        return grouped_outputs[expert_idxs, positions]
+
+    def _sequential_forward(
+        self, flat_inputs: torch.Tensor, expert_idxs: torch.Tensor, num_tokens_per_expert: List[int], *args, **kwargs
+    ) -> torch.Tensor:
+        # NOTE: if no expert got any token, run one on the empty input
+        # to get an output with the right number of features
+        if flat_inputs.shape[0] == 0:
+            return self.experts[0](flat_inputs, *args, **kwargs)
+
+        # NOTE: sort the tokens by expert, so the tokens of each expert are contiguous.
+        # Then we gather all the tokens once, and scatter all the outputs back once,
+        # instead of masking the inputs and indexing the outputs for every expert
+        sorted_idxs = expert_idxs.argsort()
+        sorted_inputs = flat_inputs[sorted_idxs]
+
+        sorted_outputs = torch.cat(
+            [
+                expert(tokens, *args, **kwargs)
+                for expert, tokens in zip(self.experts, sorted_inputs.split(num_tokens_per_expert))
+                if tokens.shape[0] > 0
+            ]
+        )
 
-    def forward(self):
-        pass
+        outputs = torch.empty_like(sorted_outputs)
+        outputs[sorted_idxs] = sorted_outputs
+        return outputs
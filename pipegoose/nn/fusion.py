@@ -0,0 +1,325 @@
+"""
+Fused elementwise kernels for GELU, bias + GELU and bias + dropout.
+
+The tanh-approximated GELU and its derivative follow Megatron-LM:
+https://github.com/NVIDIA/Megatron-LM/blob/main/megatron/model/fused_bias_gelu.py
+"""
+
+import operator
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+from torch import fx, nn
+from torch.autograd import Function
+
+
+def _compile_on_first_call(compiler: Callable[[Callable], Callable]) -> Callable[[Callable], Callable]:
+    """Defer compiling a function until it's called for the first time."""
+
+    def decorator(fn: Callable) -> Callable:
+        compiled_fn = None
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            nonlocal compiled_fn
+            if compiled_fn is None:
+                compiled_fn = compiler(fn)
+            return compiled_fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _get_jit_fuser() -> Callable[[Callable], Callable]:
+    # NOTE: since torch 2.0, torch.jit.script no longer fuses elementwise ops
+    # (nvFuser was removed from TorchScript), so each op will launch its own kernel.
+    # torch.compile generates a single Triton kernel for the whole function instead
+    torch_major_version = int(torch.__version__.split(".")[0])
+    if torch_major_version >= 2:
+
+        def compiler(fn: Callable) -> Callable:
+            # NOTE: don't pass dynamic=False, otherwise every new input shape triggers a recompile,
+            # and with fullgraph=True, hitting the recompile limit is a hard error.
+            # By default, dynamo recompiles with dynamic shapes after the first shape change
+            return torch.compile(fn, fullgraph=True)
+
+    else:
+        compiler = torch.jit.script
+
+    # NOTE: torch.compile imports torch._dynamo and torch.jit.script compiles
+    # the function right away, so doing either at import time would make importing
+    # this module slow, even if the fused kernels are never used
+    return _compile_on_first_call(compiler)
+
+
+# NOTE: select once at import time
+JIT_FUSER = _get_jit_fuser()
+
+
+@JIT_FUSER
+def _fused_gelu_fwd(x: torch.Tensor) -> torch.Tensor:
+    return x * 0.5 * (1.0 + torch.tanh(0.79788456 * x * (1 + 0.044715 * x * x)))
+
+
+@JIT_FUSER
+def _fused_gelu_bwd(g: torch.Tensor, x: torch.Tensor, bias: Optional[torch.Tensor] = None) -> torch.Tensor:
+    # NOTE: recompute the bias addition instead of saving its output in the forward pass,
+    # so the forward pass doesn't write an extra activation-sized tensor
+    if bias is not None:
+        x = x + bias
+    tanh_out = torch.tanh(0.79788456 * x * (1 + 0.044715 * x * x))
+    # NOTE: 0.1070322243 = 0.79788456 * 3 * 0.044715
+    ff = 0.5 * x * ((1 - tanh_out * tanh_out) * (0.79788456 + 0.1070322243 * x * x)) + 0.5 * (1 + tanh_out)
+    return ff * g
+
+
+@JIT_FUSER
+def _fused_bias_gelu_fwd(input: torch.Tensor, bias: torch.Tensor) -> torch.Tensor:
+    x = input + bias
+    return x * 0.5 * (1.0 + torch.tanh(0.79788456 * x * (1 + 0.044715 * x * x)))
+
+
+@JIT_FUSER
+def fused_bias_dropout(
+    x: torch.Tensor, bias: torch.Tensor, residual: Optional[torch.Tensor], p: float, training: bool, inplace: bool
+) -> torch.Tensor:
+    # NOTE: x + bias is a new tensor, so it's always safe to do dropout in place
+    output = F.dropout(x + bias, p=p, training=training, inplace=True)
+    if residual is None:
+        return output
+    if inplace:
+        return residual.add_(output)
+    return residual + output
+
+
+class _FusedGeluFn(Function):
+    @staticmethod
+    def forward(ctx: Any, input: torch.Tensor) -> torch.Tensor:
+        ctx.save_for_backward(input)
+        return _fused_gelu_fwd(input)
+
+    @staticmethod
+    def backward(ctx: Any, grad_output: torch.Tensor) -> torch.Tensor:
+        (input,) = ctx.saved_tensors
+        return _fused_gelu_bwd(grad_output, input)
+
+
+class _FusedBiasGeluFn(Function):
+    @staticmethod
+    def forward(ctx: Any, input: torch.Tensor, bias: torch.Tensor) -> torch.Tensor:
+        ctx.save_for_backward(input, bias)
+        return _fused_bias_gelu_fwd(input, bias)
+
+    @staticmethod
+    def backward(ctx: Any, grad_output: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        input, bias = ctx.saved_tensors
+        grad = _fused_gelu_bwd(grad_output, input, bias)
+
+        # NOTE: the bias is broadcasted along the leading dimensions
+        # of the input, so we reduce its gradient over them
+        broadcast_dims = tuple(range(grad.dim() - bias.dim()))
+        grad_bias = grad.sum(dim=broadcast_dims) if len(broadcast_dims) > 0 else grad
+        return (grad, grad_bias)
+
+
+class FusedGelu(nn.Module):
+    """GELU with the tanh approximation, computed by a single fused kernel."""
+
+    def forward(self, input: torch.Tensor) -> torch.Tensor:
+        return _FusedGeluFn.apply(input)
+
+
+class FusedBiasGelu(nn.Module):
+    """Add a bias then apply GELU with the tanh approximation in a single fused kernel."""
+
+    def forward(self, input: torch.Tensor, bias: torch.Tensor) -> torch.Tensor:
+        return _FusedBiasGeluFn.apply(input, bias)
+
+
+class FusedBiasDropout(nn.Module):
+    """
+    Add a bias, apply dropout then optionally add a residual in a single fused kernel.
+
+    NOTE: if `inplace` is True, the output is accumulated into the residual,
+    so the residual must not be needed by anything else.
+    """
+
+    def __init__(self, p: float = 0.5, inplace: bool = False):
+        super().__init__()
+        self.p = p
+        self.inplace = inplace
+
+    def forward(self, input: torch.Tensor, bias: torch.Tensor, residual: Optional[torch.Tensor] = None) -> torch.Tensor:
+        return fused_bias_dropout(input, bias, residual, self.p, self.training, self.inplace)
+
+
+class FusedLinearGelu(nn.Module):
+    """
+    A linear layer followed by GELU with the tanh approximation.
+
+    NOTE: at inference on CUDA, the matmul, the bias addition and the GELU
+    run as a single cuBLAS GEMM with a bias + GELU epilogue.
+    """
+
+    def __init__(self, linear: nn.Linear):
+        super().__init__()
+        # NOTE: share the parameters with the original linear layer,
+        # so the state dict keeps the same keys
+        self.weight = linear.weight
+        self.bias = linear.bias
+
+    def forward(self, input: torch.Tensor) -> torch.Tensor:
+        # NOTE: _addmm_activation has no backward, and on CPU it applies
+        # the exact GELU instead of the tanh approximation
+        if torch.is_grad_enabled() or self.bias is None or not input.is_cuda:
+            return F.gelu(F.linear(input, self.weight, self.bias), approximate="tanh")
+
+        output = torch._addmm_activation(self.bias, input.reshape(-1, input.shape[-1]), self.weight.t(), use_gelu=True)
+        return output.view(*input.shape[:-1], output.shape[-1])
+
+
+def _parent_name(target: str) -> Tuple[str, str]:
+    """Split a qualified module name into its parent's name and its own name."""
+    *parent, name = target.rsplit(".", 1)
+    return parent[0] if parent else "", name
+
+
+def replace_node_module(node: fx.Node, modules: Dict[str, nn.Module], new_module: nn.Module):
+    """Replace the module that a `call_module` node invokes."""
+    assert isinstance(node.target, str), f"node.target must be a module name, got {type(node.target)}"
+    parent_name, name = _parent_name(node.target)
+    new_module.train(modules[node.target].training)
+    modules[node.target] = new_module
+    setattr(modules[parent_name], name, new_module)
+
+
+def should_fuse_layer(module: nn.Module) -> bool:
+    """Whether a layer has a fused counterpart with the same numerics."""
+    # NOTE: the fused kernels only implement the tanh approximation
+    return isinstance(module, nn.GELU) and module.approximate == "tanh"
+
+
+def _is_call_to(node: fx.Node, modules: Dict[str, nn.Module], module_type: type) -> bool:
+    # NOTE: match the exact type, because a subclass can override forward
+    # (e.g. a quantized or LoRA linear layer), which the fused module would skip
+    return node.op == "call_module" and type(modules[node.target]) is module_type
+
+
+def _is_add(node: fx.Node) -> bool:
+    return (
+        node.op == "call_function"
+        and node.target in (operator.add, torch.add)
+        and len(node.args) == 2
+        and len(node.kwargs) == 0
+    )
+
+
+def _get_other_arg(node: fx.Node, arg: fx.Node) -> Any:
+    """Get the operand of a binary node that isn't `arg`."""
+    return node.args[1] if node.args[0] is arg else node.args[0]
+
+
+def _count_calls(fx_model: fx.GraphModule) -> Dict[str, int]:
+    """Count the number of call sites of each module."""
+    num_calls = {}
+    for node in fx_model.graph.nodes:
+        if node.op == "call_module":
+            num_calls[node.target] = num_calls.get(node.target, 0) + 1
+    return num_calls
+
+
+def _fuse_linear_gelu(fx_model: fx.GraphModule, modules: Dict[str, nn.Module]):
+    num_calls = _count_calls(fx_model)
+
+    for node in list(fx_model.graph.nodes):
+        if not _is_call_to(node, modules, nn.Linear) or len(node.users) != 1:
+            continue
+
+        # NOTE: the linear layer is replaced in place, so it must not be
+        # shared with another call site that isn't followed by a GELU
+        if num_calls[node.target] != 1:
+            continue
+
+        act_node = next(iter(node.users))
+        if act_node.op != "call_module" or not should_fuse_layer(modules[act_node.target]):
+            continue
+
+        replace_node_module(node, modules, FusedLinearGelu(modules[node.target]))
+        act_node.replace_all_uses_with(node)
+        fx_model.graph.erase_node(act_node)
+
+
+def _get_bias_dropout_residual(node: fx.Node, modules: Dict[str, nn.Module]) -> Optional[Tuple[fx.Node, fx.Node, fx.Node]]:
+    """Match `add(bias) -> dropout -> add(residual)`, return the (bias_add, dropout, residual_add) nodes."""
+    if not _is_call_to(node, modules, nn.Dropout) or len(node.users) != 1:
+        return None
+
+    bias_add_node = node.args[0]
+    residual_add_node = next(iter(node.users))
+
+    if not isinstance(bias_add_node, fx.Node) or not _is_add(bias_add_node) or len(bias_add_node.users) != 1:
+        return None
+    if not _is_add(residual_add_node) or residual_add_node.args[0] is residual_add_node.args[1]:
+        return None
+
+    return bias_add_node, node, residual_add_node
+
+
+def _fuse_bias_dropout_residual(fx_model: fx.GraphModule, modules: Dict[str, nn.Module]):
+    graph = fx_model.graph
+    num_calls = _count_calls(fx_model)
+
+    for node in list(graph.nodes):
+        matched = _get_bias_dropout_residual(node, modules)
+        # NOTE: the dropout layer is replaced in place, so it must not be
+        # shared with another call site that isn't part of the pattern
+        if matched is None or num_calls[node.target] != 1:
+            continue
+
+        bias_add_node, dropout_node, residual_add_node = matched
+        input, bias = bias_add_node.args
+        residual = _get_other_arg(residual_add_node, dropout_node)
+
+        replace_node_module(dropout_node, modules, FusedBiasDropout(p=modules[dropout_node.target].p))
+
+        # NOTE: insert the fused node at the residual addition,
+        # because the residual can be computed after the dropout
+        with graph.inserting_before(residual_add_node):
+            fused_node = graph.call_module(dropout_node.target, args=(input, bias, residual))
+
+        residual_add_node.replace_all_uses_with(fused_node)
+        graph.erase_node(residual_add_node)
+        graph.erase_node(dropout_node)
+        graph.erase_node(bias_add_node)
+
+
+def _fuse_gelu(fx_model: fx.GraphModule, modules: Dict[str, nn.Module]):
+    for node in fx_model.graph.nodes:
+        if node.op == "call_module" and should_fuse_layer(modules[node.target]):
+            replace_node_module(node, modules, FusedGelu())
+
+
+def fuse(module: nn.Module) -> fx.GraphModule:
+    """
+    Replace the layers of a module with their fused counterparts.
+
+    NOTE: `module` itself is left unchanged, but the returned module shares
+    the layers that aren't replaced, and all the parameters, with it.
+    """
+    fx_model = fx.symbolic_trace(module)
+    fx_model.train(module.training)
+    modules = dict(fx_model.named_modules())
+
+    # NOTE: fuse linear + gelu first, then the remaining standalone gelus
+    _fuse_linear_gelu(fx_model, modules)
+    _fuse_gelu(fx_model, modules)
+    _fuse_bias_dropout_residual(fx_model, modules)
+
+    fx_model.graph.lint()
+    fx_model.delete_all_unused_submodules()
+    fx_model.recompile()
+
+    return fx_model
@@ -21,8 +21,21 @@ from pipegoose.nn.pipeline_parallel._job.forward import (
 from pipegoose.nn.pipeline_parallel._job.job import Job
 from pipegoose.nn.pipeline_parallel._job.job_type import JobType
 from pipegoose.nn.pipeline_parallel._package import Metadata, Package
+from pipegoose.nn.pipeline_parallel.exception import (
+    PipelineNoSavedActivationError,
+    PipelineNoSavedInput,
+)
 from pipegoose.nn.pipeline_parallel.pipeline_context import PipelineContext
-from pipegoose.nn.pipeline_parallel.queue import JobQueue
+from pipegoose.nn.pipeline_parallel.queue import (
+    _SAVED_GRAD_LOSS,
+    _SAVED_SCHEDULED_ACTIVATIONS,
+    InputActivations,
+    JobQueue,
+    SavedActivation,
+    _SAVED_METADATA_of_GRAD_LOSS,
+    get_input_activations,
+    get_output_activations,
+)
 
 
 class JobCreator(ABC):
@@ -40,15 +53,16 @@ class ScheduleBackwardJobCallback(Callback):
         self.pipeline_context = pipeline_context
 
     def after_compute(self):
-        from pipegoose.nn.pipeline_parallel.queue import (
-            get_input_activations,
-            get_output_activations,
-        )
-
         package = self.job.output
         microbatch_idx = self.job.input.metadata.microbatch_idx
         partition_idx = self.job.input.metadata.partition_idx
 
+        # NOTE: in inference, there is no backward pass to schedule,
+        # but the pipeline engine still reads the outputs from here
+        if not package.data.requires_grad:
+            _SAVED_SCHEDULED_ACTIVATIONS[(microbatch_idx, partition_idx)] = package.data
+            return
+
         assert isinstance(get_input_activations(microbatch_idx, partition_idx), torch.Tensor)
         assert isinstance(get_output_activations(microbatch_idx, partition_idx), torch.Tensor)
 
@@ -59,11 +73,22 @@ class ScheduleBackwardJobCallback(Callback):
             new_package = save_grad_loss(package)
             self.job.output = new_package
 
-        from pipegoose.nn.pipeline_parallel.queue import _SAVED_SCHEDULED_ACTIVATIONS
-
         _SAVED_SCHEDULED_ACTIVATIONS[(microbatch_idx, partition_idx)] = new_package.data
 
 
+def _assert_activations_saved(microbatch_idx: int, partition_idx: int):
+    """Make sure the forward job saved the activations that its backward job needs."""
+    # NOTE: unlike an assert, these checks aren't stripped with python -O
+    if not SavedActivation.is_saved(microbatch_idx, partition_idx):
+        raise PipelineNoSavedActivationError(
+            f"No saved activations for microbatch_idx={microbatch_idx}, partition_idx={partition_idx}"
+        )
+    if not InputActivations.is_saved(microbatch_idx, partition_idx):
+        raise PipelineNoSavedInput(
+            f"No saved input activations for microbatch_idx={microbatch_idx}, partition_idx={partition_idx}"
+        )
+
+
 class _ForwardJobCreator(JobCreator):
     """Create a forward job for pipeline parallelism."""
 
@@ -91,22 +116,7 @@ class _BackwardJobCreator(JobCreator):
     def create(
         cls, function: Callable, package: Package, parallel_context: ParallelContext, pipeline_context: PipelineContext
     ) -> BackwardJob:
-        from pipegoose.nn.pipeline_parallel.queue import (
-            InputActivations,
-            SavedActivation,
-        )
-
-        microbatch_idx = package.metadata.microbatch_idx
-        partition_idx = package.metadata.partition_idx
-
-        assert (
-            SavedActivation.is_saved(microbatch_idx, partition_idx) is True
-        ), f"No saved activations for \
-            microbatch_idx={microbatch_idx}, partition_idx={partition_idx}"
-        assert (
-            InputActivations.is_saved(microbatch_idx, partition_idx) is True
-        ), f"No saved input activations for \
-            microbatch_idx={microbatch_idx}, partition_idx={partition_idx}"
+        _assert_activations_saved(package.metadata.microbatch_idx, package.metadata.partition_idx)
 
         callbacks = [
             CreateBackwardOutputPackageCallback(parallel_context, pipeline_context),
@@ -117,6 +127,12 @@ class _BackwardJobCreator(JobCreator):
         return job
 
 
+_JOB_TYPE_TO_CREATOR = {
+    JobType.FORWARD: _ForwardJobCreator,
+    JobType.BACKWARD: _BackwardJobCreator,
+}
+
+
 def create_job(
     function: Callable, package: Package, parallel_context: ParallelContext, pipeline_context: PipelineContext
 ) -> Union[ForwardJob, BackwardJob]:
@@ -126,13 +142,8 @@ def create_job(
         pipeline_context, PipelineContext
     ), f"pipeline_context must be an instance of PipelineContext, got {type(pipeline_context)}"
 
-    JOB_TYPE_TO_CREATOR = {
-        JobType.FORWARD: _ForwardJobCreator,
-        JobType.BACKWARD: _BackwardJobCreator,
-    }
-
     job_type = package.metadata.job_type
-    job = JOB_TYPE_TO_CREATOR[job_type].create(function, package, parallel_context, pipeline_context)
+    job = _JOB_TYPE_TO_CREATOR[job_type].create(function, package, parallel_context, pipeline_context)
 
     return job
 
@@ -151,54 +162,53 @@ def _create_backward_job_and_put_to_pending_queue(grad_input: torch.Tensor, meta
     pipeline_context = PipelineContext.get_context()
     parallel_context = ParallelContext.get_context()
 
-    rank = parallel_context.get_global_rank()
-    microbatch_idx = metadata.microbatch_idx
-
-    print(f"invoked create_backward_job_and_put_to_pending_queue, rank={rank}, microbatch_idx={microbatch_idx}")
-
     backward_job = create_job(backward_function, package, parallel_context, pipeline_context)
 
     # NOTE : put the backward job to pending queue
     JobQueue.PENDING_JOBS.put(backward_job)
 
 
+class _ScheduleBackwardFunction(torch.autograd.Function):
+    @staticmethod
+    def forward(ctx, metadata: Metadata, input: torch.Tensor) -> torch.Tensor:
+        ctx.package_meta = metadata
+        return input
+
+    @staticmethod
+    def backward(ctx, grad_input: torch.Tensor) -> (None, torch.Tensor):
+        metadata = ctx.package_meta
+        _create_backward_job_and_put_to_pending_queue(grad_input, metadata)
+        return (None, grad_input)
+
+
 def schedule_backward_job(package: Package, pipeline_context: PipelineContext) -> Package:
-    class Function(torch.autograd.Function):
-        @staticmethod
-        def forward(ctx, metadata: Metadata, input: torch.Tensor) -> torch.Tensor:
-            ctx.package_meta = metadata
-            return input
-
-        @staticmethod
-        def backward(ctx, grad_input: torch.Tensor) -> (None, torch.Tensor):
-            metadata = ctx.package_meta
-            print("trigger creating backward job")
-            _create_backward_job_and_put_to_pending_queue(grad_input, metadata)
-            return (None, grad_input)
+    # NOTE: in inference, don't add a node to the autograd graph
+    if not torch.is_grad_enabled() or not package.data.requires_grad:
+        return package
 
     data = package.data
-    new_data = Function.apply(package.metadata, data)
+    new_data = _ScheduleBackwardFunction.apply(package.metadata, data)
     package.data = new_data
     return package
 
 
-def schedule_backward_execution(package: Package, pipeline_context: PipelineContext) -> Package:
-    class Function(torch.autograd.Function):
-        @staticmethod
-        def forward(ctx, metadata: Metadata, input: torch.Tensor) -> torch.Tensor:
-            ctx.package_meta = metadata
-            new_input = input.detach().clone()
-            return new_input
-
-        @staticmethod
-        def backward(ctx, grad_input: torch.Tensor) -> (None, torch.Tensor):
-            metadata = ctx.package_meta
-            print("trigger creating backward job")
-            _run_backward_execution(grad_input, metadata)
-            return (None, None)
+class _ScheduleBackwardExecutionFunction(torch.autograd.Function):
+    @staticmethod
+    def forward(ctx, metadata: Metadata, input: torch.Tensor) -> torch.Tensor:
+        ctx.package_meta = metadata
+        new_input = input.detach().clone()
+        return new_input
+
+    @staticmethod
+    def backward(ctx, grad_input: torch.Tensor) -> (None, torch.Tensor):
+        metadata = ctx.package_meta
+        _run_backward_execution(grad_input, metadata)
+        return (None, None)
 
+
+def schedule_backward_execution(package: Package, pipeline_context: PipelineContext) -> Package:
     data = package.data
-    new_data = Function.apply(package.metadata, data)
+    new_data = _ScheduleBackwardExecutionFunction.apply(package.metadata, data)
     package.data = new_data
     return package
 
@@ -247,11 +257,6 @@ def _run_backward_execution(grad_input, metadata):
 
                 if pipeline_context.is_last_stage:
                     if pipeline_context.is_last_microbatch(microbatch_idx) is False:
-                        from pipegoose.nn.pipeline_parallel.queue import (
-                            _SAVED_GRAD_LOSS,
-                            _SAVED_METADATA_of_GRAD_LOSS,
-                        )
-
                         grad_input = _SAVED_GRAD_LOSS[(microbatch_idx, partition_idx)]
                         metadata = _SAVED_METADATA_of_GRAD_LOSS[(microbatch_idx, partition_idx)]
 
@@ -78,7 +78,8 @@ class Job(ABC):
     def add_cbs(self, cbs: List[Callback]):
         """Add a list of callbacks to this job."""
         for cb in cbs:
-            self.add_cb(cb)
+            self._add_cb(cb)
+        self._sort_cbs()
 
     def remove_cbs(self, cbs: List[Callback]):
         for cb in cbs:
@@ -86,6 +87,10 @@ class Job(ABC):
 
     def add_cb(self, cb: Callback):
         """Add a callback to this job."""
+        self._add_cb(cb)
+        self._sort_cbs()
+
+    def _add_cb(self, cb: Callback):
         if isinstance(cb, type):
             cb = cb()
 
@@ -95,6 +100,11 @@ class Job(ABC):
         cb.job = self
         self.cbs.append(cb)
 
+    def _sort_cbs(self):
+        # NOTE: keep the callbacks sorted by their order when they are added,
+        # so we don't sort them again every time we run an event
+        self.cbs.sort(key=lambda x: x.order)
+
     def remove_cb(self, cb: Callback):
         """Remove a callback from this job."""
         # NOTE: if cb is a class
@@ -110,11 +120,10 @@ class Job(ABC):
             event_name, CallbackEvent
         ), f"event_name must be an instance of CallbackEvent, got {type(event_name)}"
 
-        sorted_cbs = sorted(self.cbs, key=lambda x: x.order)
         # NOTE: get the value of an enum member
         event_name = event_name.value
 
-        for cb in sorted_cbs:
+        for cb in self.cbs:
             event_method = getattr(cb, event_name, None)
             if event_method is not None:
                 event_method()
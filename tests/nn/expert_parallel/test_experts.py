@@ -0,0 +1,94 @@
+import pytest
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+from pipegoose.nn.expert_parallel.experts import Experts
+
+BATCH_SIZE, SEQ_LEN, HIDDEN_SIZE = 5, 10, 20
+NUM_EXPERTS = 4
+
+
+EXPERTS = [
+    nn.Linear(HIDDEN_SIZE, HIDDEN_SIZE),
+    nn.Sequential(nn.Linear(HIDDEN_SIZE, HIDDEN_SIZE * 2), nn.ReLU(), nn.Linear(HIDDEN_SIZE * 2, HIDDEN_SIZE)),
+]
+
+
+@pytest.mark.parametrize("expert", EXPERTS)
+def test_experts(expert):
+    inputs = torch.randn(BATCH_SIZE, SEQ_LEN, HIDDEN_SIZE)
+    # NOTE: spread the tokens evenly over all experts but the last one,
+    # which is left without any tokens
+    expert_idxs = torch.randperm(BATCH_SIZE * SEQ_LEN).remainder(NUM_EXPERTS - 1).view(BATCH_SIZE, SEQ_LEN)
+    dispatching_order = F.one_hot(expert_idxs, num_classes=NUM_EXPERTS)
+
+    experts = Experts(NUM_EXPERTS, expert, parallel_context=None)
+    assert experts.is_grouped is isinstance(expert, nn.Linear)
+    assert len(experts.experts) == NUM_EXPERTS
+
+    # NOTE: make the experts different from each other
+    with torch.no_grad():
+        for param in experts.parameters():
+            param.normal_()
+
+    outputs = experts(inputs, dispatching_order)
+
+    assert outputs.shape == inputs.shape
+
+    for batch_idx in range(BATCH_SIZE):
+        for token_idx in range(SEQ_LEN):
+            expert_layer = experts.experts[expert_idxs[batch_idx, token_idx]]
+            expected_output = expert_layer(inputs[batch_idx, token_idx])
+            assert torch.allclose(outputs[batch_idx, token_idx], expected_output, rtol=1e-4, atol=1e-4)
+
+    outputs.sum().backward()
+
+    if experts.is_grouped:
+        # NOTE: the last expert didn't get any tokens
+        assert torch.count_nonzero(experts.weight.grad[:-1]) > 0
+        assert torch.count_nonzero(experts.weight.grad[-1]) == 0
+
+
+@pytest.mark.parametrize("expert", EXPERTS)
+def test_experts_with_skewed_routing(expert):
+    inputs = torch.randn(BATCH_SIZE, SEQ_LEN, HIDDEN_SIZE)
+    # NOTE: send every token but one to the first expert
+    expert_idxs = torch.zeros(BATCH_SIZE, SEQ_LEN, dtype=torch.long)
+    expert_idxs[0, 0] = 1
+    dispatching_order = F.one_hot(expert_idxs, num_classes=NUM_EXPERTS)
+
+    experts = Experts(NUM_EXPERTS, expert, parallel_context=None)
+    with torch.no_grad():
+        for param in experts.parameters():
+            param.normal_()
+
+    # NOTE: padding every expert to the busiest one would compute
+    # NUM_EXPERTS times more tokens, so the experts run one by one instead
+    num_tokens_per_expert = torch.bincount(expert_idxs.flatten(), minlength=NUM_EXPERTS).tolist()
+    assert experts._is_worth_grouping(num_tokens_per_expert) is False
+
+    outputs = experts(inputs, dispatching_order)
+
+    for batch_idx in range(BATCH_SIZE):
+        for token_idx in range(SEQ_LEN):
+            expert_layer = experts.experts[expert_idxs[batch_idx, token_idx]]
+            expected_output = expert_layer(inputs[batch_idx, token_idx])
+            assert torch.allclose(outputs[batch_idx, token_idx], expected_output, rtol=1e-4, atol=1e-4)
+
+    outputs.sum().backward()
+
+    if experts.is_grouped:
+        assert torch.count_nonzero(experts.weight.grad[:2]) > 0
+        assert torch.count_nonzero(experts.weight.grad[2:]) == 0
+
+
+@pytest.mark.parametrize("expert", EXPERTS)
+def test_experts_without_tokens(expert):
+    inputs = torch.randn(0, HIDDEN_SIZE)
+    dispatching_order = torch.zeros(0, NUM_EXPERTS)
+
+    experts = Experts(NUM_EXPERTS, expert, parallel_context=None)
+    outputs = experts(inputs, dispatching_order)
+
+    assert outputs.shape == (0, HIDDEN_SIZE)
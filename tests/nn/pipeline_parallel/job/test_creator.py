@@ -1,12 +1,20 @@
 import pytest
+import torch
 import torch.distributed as dist
 from torch import nn
 
 from pipegoose.distributed.parallel_mode import ParallelMode
 from pipegoose.nn.pipeline_parallel._job.backward import BackwardJob
-from pipegoose.nn.pipeline_parallel._job.creator import create_job
-from pipegoose.nn.pipeline_parallel._job.forward import ForwardJob
+from pipegoose.nn.pipeline_parallel._job.creator import (
+    ScheduleBackwardJobCallback,
+    create_job,
+)
+from pipegoose.nn.pipeline_parallel._job.forward import (
+    CreateForwardOutputPackageCallback,
+    ForwardJob,
+)
 from pipegoose.nn.pipeline_parallel._job.job import JobStatus
+from pipegoose.nn.pipeline_parallel.queue import _SAVED_SCHEDULED_ACTIVATIONS
 from pipegoose.nn.pipeline_parallel.sync.handshake import ProgressTracker
 from pipegoose.nn.pipeline_parallel.sync.progress_tracker import (
     get_progresses_from_pipeline_context,
@@ -28,6 +36,29 @@ def test_backward_job(backward_package, parallel_context, pipeline_context):
     assert job.status == JobStatus.EXECUTED
 
 
+def test_schedule_backward_job_callback_in_inference(forward_package, parallel_context, pipeline_context):
+    forward_package.metadata.training.is_training = False
+    forward_package.metadata.training.is_grad_enabled = False
+    microbatch_idx = forward_package.metadata.microbatch_idx
+    partition_idx = forward_package.metadata.partition_idx
+    _SAVED_SCHEDULED_ACTIVATIONS.pop((microbatch_idx, partition_idx), None)
+
+    cbs = [
+        CreateForwardOutputPackageCallback(parallel_context, pipeline_context),
+        ScheduleBackwardJobCallback(pipeline_context),
+    ]
+    forward_job = ForwardJob(function, forward_package, cbs)
+
+    output = forward_job.compute()
+
+    # NOTE: the pipeline engine reads the outputs of inference from the saved activations
+    assert _SAVED_SCHEDULED_ACTIVATIONS[(microbatch_idx, partition_idx)] is output.data
+    assert torch.equal(output.data, function(forward_package.data).detach())
+    # NOTE: no backward job is scheduled, so no autograd node is added
+    assert output.data.requires_grad is False
+    assert output.data.grad_fn is None
+
+
 def run_create_a_job_from_package(
     rank, world_size, port, tensor_parallel_size, pipeline_parallel_size, data_parallel_size, package, job_cls
 ):
@@ -0,0 +1,183 @@
+import pytest
+import torch
+import torch.nn.functional as F
+from torch import nn
+
+from pipegoose.nn.fusion import (
+    FusedBiasDropout,
+    FusedBiasGelu,
+    FusedGelu,
+    FusedLinearGelu,
+    fuse,
+)
+from pipegoose.testing.utils import skip_if_no_cuda
+
+
+def test_fused_gelu():
+    input = torch.randn(5, 10, 20, requires_grad=True)
+    ref_input = input.detach().clone().requires_grad_(True)
+
+    output = FusedGelu()(input)
+    ref_output = F.gelu(ref_input, approximate="tanh")
+
+    assert torch.allclose(output, ref_output, atol=1e-6)
+
+    output.sum().backward()
+    ref_output.sum().backward()
+
+    assert torch.allclose(input.grad, ref_input.grad, atol=1e-5)
+
+
+def test_fused_bias_gelu():
+    input = torch.randn(5, 10, 20, requires_grad=True)
+    bias = torch.randn(20, requires_grad=True)
+    ref_input = input.detach().clone().requires_grad_(True)
+    ref_bias = bias.detach().clone().requires_grad_(True)
+
+    output = FusedBiasGelu()(input, bias)
+    ref_output = F.gelu(ref_input + ref_bias, approximate="tanh")
+
+    assert torch.allclose(output, ref_output, atol=1e-6)
+
+    output.sum().backward()
+    ref_output.sum().backward()
+
+    assert torch.allclose(input.grad, ref_input.grad, atol=1e-5)
+    assert torch.allclose(bias.grad, ref_bias.grad, atol=1e-4)
+
+
+@pytest.mark.parametrize("training", [True, False])
+def test_fused_bias_dropout(training):
+    input = torch.randn(5, 10, 20)
+    bias = torch.randn(20)
+
+    dropout = FusedBiasDropout(p=0.5)
+    dropout.train(training)
+    output = dropout(input, bias)
+
+    if training:
+        # NOTE: the retained elements are scaled by 1 / (1 - p)
+        mask = output != 0
+        assert torch.allclose(output[mask], (input + bias)[mask] * 2)
+    else:
+        assert torch.allclose(output, input + bias)
+
+
+@pytest.mark.parametrize("inplace", [True, False])
+def test_fused_bias_dropout_with_residual(inplace):
+    input = torch.randn(5, 10, 20)
+    bias = torch.randn(20)
+    residual = torch.randn(5, 10, 20)
+    # NOTE: add in the same order as the fused kernel
+    expected_output = residual + (input + bias)
+
+    dropout = FusedBiasDropout(p=0.5, inplace=inplace)
+    dropout.eval()
+    output = dropout(input, bias, residual)
+
+    assert torch.allclose(output, expected_output, atol=1e-6)
+    # NOTE: inplace accumulates the output into the residual
+    assert torch.allclose(residual, expected_output, atol=1e-6) is inplace
+
+
+@pytest.mark.parametrize(
+    "fused_fn",
+    [
+        lambda input, bias, residual: FusedGelu()(input),
+        lambda input, bias, residual: FusedBiasGelu()(input, bias),
+        lambda input, bias, residual: FusedBiasDropout(p=0.5)(input, bias),
+        lambda input, bias, residual: FusedBiasDropout(p=0.5)(input, bias, residual),
+    ],
+)
+def test_fused_modules_with_varying_input_shapes(fused_fn):
+    HIDDEN_SIZE = 8
+    # NOTE: more distinct shapes than the default recompile limit of torch.compile (8)
+    NUM_SHAPES = 12
+
+    for batch_size in range(1, NUM_SHAPES + 1):
+        input = torch.randn(batch_size, HIDDEN_SIZE, requires_grad=True)
+        bias = torch.randn(HIDDEN_SIZE, requires_grad=True)
+        residual = torch.randn(batch_size, HIDDEN_SIZE)
+
+        output = fused_fn(input, bias, residual)
+        output.sum().backward()
+
+        assert output.shape == input.shape
+        assert input.grad.shape == input.shape
+
+
+class MLP(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.fc1 = nn.Linear(20, 40)
+        self.act = nn.GELU(approximate="tanh")
+        self.fc2 = nn.Linear(40, 20)
+        self.out_act = nn.GELU(approximate="tanh")
+
+    def forward(self, x):
+        x = self.fc2(self.act(self.fc1(x)))
+        # NOTE: the residual connection makes fc2 have two users
+        return self.out_act(x) + x
+
+
+@pytest.mark.parametrize("device", ["cpu", pytest.param("cuda", marks=skip_if_no_cuda)])
+def test_fuse_linear_gelu(device):
+    input = torch.randn(5, 10, 20, device=device)
+    model = MLP().to(device)
+    ref_output = model(input)
+    state_dict = model.state_dict()
+
+    fused_model = fuse(model)
+
+    assert isinstance(fused_model.fc1, FusedLinearGelu)
+    assert isinstance(fused_model.fc2, nn.Linear)
+    assert isinstance(fused_model.out_act, FusedGelu)
+    assert not hasattr(fused_model, "act")
+    assert fused_model.state_dict().keys() == state_dict.keys()
+
+    assert torch.allclose(fused_model(input), ref_output, atol=1e-5)
+    with torch.no_grad():
+        assert torch.allclose(fused_model(input), ref_output, atol=1e-4)
+
+
+class ScaledLinear(nn.Linear):
+    def forward(self, input):
+        return super().forward(input) * 2
+
+
+def test_fuse_doesnt_replace_a_linear_subclass():
+    input = torch.randn(5, 10, 20)
+    model = MLP()
+    model.fc1 = ScaledLinear(20, 40)
+    ref_output = model(input)
+
+    fused_model = fuse(model)
+
+    assert type(fused_model.fc1) is ScaledLinear
+    assert isinstance(fused_model.act, FusedGelu)
+    assert torch.allclose(fused_model(input), ref_output, atol=1e-5)
+
+
+class BiasDropoutResidual(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.fc = nn.Linear(20, 20, bias=False)
+        self.bias = nn.Parameter(torch.randn(20))
+        self.dropout = nn.Dropout(p=0.1)
+
+    def forward(self, x):
+        return self.dropout(self.fc(x) + self.bias) + x
+
+
+def test_fuse_bias_dropout_residual():
+    input = torch.randn(5, 10, 20)
+    model = BiasDropoutResidual()
+    model.eval()
+    ref_output = model(input)
+
+    fused_model = fuse(model)
+
+    assert isinstance(fused_model.dropout, FusedBiasDropout)
+    assert fused_model.dropout.p == 0.1
+    assert len([node for node in fused_model.graph.nodes if node.op == "call_function"]) == 0
+    assert torch.allclose(fused_model(input), ref_output, atol=1e-6)